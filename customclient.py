@@ -16,20 +16,24 @@ Modules:
     - `logging`: Logging utilities for debugging and information.
 """
 
-from discord import Interaction, Intents, Status, Activity, ActivityType, Member
+from discord import Interaction, Intents, Status, Activity, ActivityType, Member, User, TextChannel, HTTPException, NotFound
 from discord.ext.commands import Bot
 from discord.ext import tasks
 from os import getenv
-from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session, selectinload, joinedload
 from models import *
-from sqlalchemy import text
+from sqlalchemy import inspect
 from datetime import datetime
 from typing import Any, Callable
+from contextlib import asynccontextmanager, nullcontext
 from singleton import Singleton
 import asyncio
+import signal
+import time
 import templates
 import logging
-from utils import uses_db, RollingCounterDict
+from utils import uses_db, gather_all, SlidingWindowCounter, TokenBucket, AdaptiveLimiter
 
 use_ephemeral = getenv("EPHEMERAL", "false").lower() == "true"
 
@@ -44,24 +48,27 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
 
     Attributes:
         - `mod_roles`: (Set[str]) Roles with moderator privileges.
-        - `session`: (Session) Database session for executing SQL queries.
+        - `sessionmaker`: (Callable) Creates the database sessions used per command and per task.
         - `use_ephemeral`: (bool) Controls whether to send messages as ephemeral.
         - `config`: (dict) Bot configuration loaded from the database.
         - `uses_db`: (Callable) A decorator for database operations.
     """
     mod_roles = {1308924912936685609, 1302095620231794698}
     gm_role = 1308925031069388870
-    session: Session
+    max_workers = 8 # number of queue consumers, how many of them process tasks at once is adapted by worker_limiter
     use_ephemeral: bool
     config: dict
+    banned_users: frozenset[int]
     sessionmaker: Callable
     start_time: datetime
-    def __init__(self, session: Session,/, sessionmaker: Callable, **kwargs):
+    dossier_channel: TextChannel | None
+    statistics_channel: TextChannel | None
+    def __init__(self, sessionmaker: Callable, **kwargs):
         """
         Initializes the CustomClient instance.
 
         Args:
-            session (Session): The SQLAlchemy session for database operations.
+            sessionmaker (Callable): The SQLAlchemy sessionmaker, a short lived session is made from it for each command and task.
             **kwargs: Additional keyword arguments for the Bot constructor.
 
         Merges the `DEFAULTS` with provided `kwargs`, loads configurations, and initializes
@@ -74,35 +81,63 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         super().__init__(**kwargs)
         self.owner_ids = {533009808501112881, 126747253342863360}
         self.sessionmaker = sessionmaker
-        self.queue = asyncio.Queue()
-        _Config = session.query(Config).filter(Config.key == "BOT_CONFIG").first()
-        if not _Config:
-            _Config = Config(key="BOT_CONFIG", value={"EXTENSIONS":[]})
-            session.add(_Config)
-            session.commit()
-        self.config:dict = _Config.value
-        _Medal_Emotes = session.query(Config).filter(Config.key == "MEDAL_EMOTES").first()
-        if not _Medal_Emotes:
-            _Medal_Emotes = Config(key="MEDAL_EMOTES", value={})
-            session.add(_Medal_Emotes)
-            session.commit()
-        self.medal_emotes:dict = _Medal_Emotes.value
+        self.queue = asyncio.Queue(maxsize=200) # bounded so producers wait instead of the queue growing without limit
+        self.channel_buckets: dict[int, TokenBucket] = {}
+        self.worker_limiter = AdaptiveLimiter(initial=2, maximum=self.max_workers) # halved on 429s, grows again after a minute without one
+        self.ratelimit = SlidingWindowCounter(30) # shared by all the queue consumers
+        self.pending_updates: set[tuple[int, int]] = set() # (task type, player id) of player tasks currently in the queue
+        self._player_locks: dict[int, list] = {} # player id -> [lock, holders and waiters], so tasks for one player run one at a time
+        self._consumers_started = False
+        self._user_cache: dict[int, tuple[float, User]] = {} # user id -> (time fetched, user), oldest first
+        self._known_messages: dict[int, None] = {} # ids of messages we've seen alive, used as an insertion ordered set
+        self._player_id_by_discord: dict[int, int] = {} # discord id -> player id, filled as players are looked up
+        self.dossier_channel = None # resolved in on_ready, once the channel cache is populated
+        self.statistics_channel = None
+        # per model handlers for each task type, looked up by the exact type of the instance
+        self._create_dispatch = {Player: self._create_player, Unit: self._create_unit, PlayerUpgrade: self._create_upgrade}
+        self._update_dispatch = {Player: self._update_player, Unit: self._update_unit, PlayerUpgrade: self._update_upgrade}
+        self._delete_dispatch = {Dossier: self._delete_dossier, Statistic: self._delete_statistic, PlayerUpgrade: self._delete_upgrade}
+        with sessionmaker() as session: # only needed for loading the config, everything after this makes its own sessions
+            _Config = session.query(Config).filter(Config.key == "BOT_CONFIG").first()
+            if not _Config:
+                _Config = Config(key="BOT_CONFIG", value={"EXTENSIONS":[]})
+                session.add(_Config)
+                session.commit()
+            self.config:dict = _Config.value
+            _Medal_Emotes = session.query(Config).filter(Config.key == "MEDAL_EMOTES").first()
+            if not _Medal_Emotes:
+                _Medal_Emotes = Config(key="MEDAL_EMOTES", value={})
+                session.add(_Medal_Emotes)
+                session.commit()
+            self.medal_emotes:dict = _Medal_Emotes.value
         self.use_ephemeral = use_ephemeral
+        self.load_banned_users()
         self.tree.interaction_check = self.check_banned_interaction
 
+    def load_banned_users(self):
+        """
+        Parses the comma separated BANNED_USERS env variable into a set of user ids.
+
+        Called once at startup, and again on SIGHUP after reloading the local env file, so interactions don't re-parse it.
+        """
+        self.banned_users = frozenset(int(user) for user in getenv("BANNED_USERS", "").split(",") if user.strip())
+        logger.debug(f"Loaded {len(self.banned_users)} banned users")
+
+    def _reload_banned_users(self):
+        # SIGHUP handler, the env files are only read at startup, so reload the local one before re-parsing
+        local_env_file = getenv("LOCAL_ENV_FILE")
+        if local_env_file:
+            load_dotenv(local_env_file, override=True)
+        self.load_banned_users()
+
     async def check_banned_interaction(self, interaction: Interaction):
-        # check if the user.id is in the BANNED_USERS env variable, if so, reply with a message and return False, else return True
-        logger.debug(f"Interaction check for user {interaction.user.global_name}")
-        banned_users = getenv("BANNED_USERS", "").split(",")
-        if not banned_users[0]: # if the env was empty, split returns [""], so we need to check for that
-            logger.debug(f"Interaction check passed for user {interaction.user.global_name}")
-            return True
-        banned_users = [int(user) for user in banned_users]
-        if interaction.user.id in banned_users:
+        # check if the user.id is in the banned users, if so, reply with a message and return False, else return True
+        logger.debug("Interaction check for user %s", interaction.user.global_name)
+        if interaction.user.id in self.banned_users:
             await interaction.response.send_message("You are banned from using this bot", ephemeral=self.use_ephemeral)
-            logger.warning(f"Interaction check failed for user {interaction.user.global_name}")
+            logger.warning("Interaction check failed for user %s", interaction.user.global_name)
             return False
-        logger.debug(f"Interaction check passed for user {interaction.user.global_name}")
+        logger.debug("Interaction check passed for user %s", interaction.user.global_name)
         return True
 
     async def resync_config(self, session: Session):
@@ -116,7 +151,17 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         """
         _Config = session.query(Config).filter(Config.key == "BOT_CONFIG").first()
         _Config.value = self.config
-        logger.debug(f"Resynced config: {self.config}")
+        self.resolve_channels() # the channel ids may have changed
+        logger.debug("Resynced config: %s", self.config)
+
+    def resolve_channels(self):
+        """
+        Resolves the dossier and statistics channels from the configuration, so the queue handlers don't look them up per task.
+        """
+        dossier_channel_id = self.config.get("dossier_channel_id")
+        statistics_channel_id = self.config.get("statistics_channel_id")
+        self.dossier_channel = self.get_channel(dossier_channel_id) if dossier_channel_id else None
+        self.statistics_channel = self.get_channel(statistics_channel_id) if statistics_channel_id else None
 
     async def queue_consumer(self, session: Session):
         """
@@ -135,291 +180,432 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
             Exception: If task processing encounters an error.
         """
         logger.info("queue consumer started")
-        unknown_handler = lambda task: logger.error(f"Unknown task type: {task}")
-        handlers = {
-            0: self._handle_create_task,
-            1: self._handle_update_task,
-            2: self._handle_delete_task,
-            4: self._handle_terminate_task
-        }
-        ratelimit = RollingCounterDict(30)
-        nosleep = True
-        
+        dispatch = self._task_dispatch
+        ratelimit = self.ratelimit
+
         while True:
-            if nosleep:
-                await asyncio.sleep(0)
-                nosleep = False
-            else:
-                await asyncio.sleep(5)  # Maintain pacing to avoid hitting downstream timeouts
-            logger.debug(f"Queue size: {self.queue.qsize()}")
-            if self.queue.qsize() >= 400:
-                logger.critical(f"Queue size is {self.queue.qsize()}, this is too high!")
-                # fetch the discord user for the bot owner, message them, then call self.close()
-                owner = await self.fetch_user(533009808501112881)
-                if owner:
-                    await owner.send("Queue size is too high, terminating")
-                await self.close()
+            # pacing is done per channel in the handlers, so we only block here when the queue is empty
+            logger.debug("Queue size: %s", self.queue.qsize())
             task = await self.queue.get()
             if not isinstance(task, tuple):
                 logger.error("Task is not a tuple, skipping")
-                nosleep = True
                 continue
-            # we need to recraft the tuple before we can log it, because the session is detached
-            if len(task) == 3:
-                task = (task[0], session.merge(task[1]), task[2])
-            elif len(task) == 2:
-                task = (task[0], session.merge(task[1]), 0)
+            # the instance is kept detached, it only carries its class and primary key to the handlers, which load it themselves
+            if len(task) == 2:
+                task = (task[0], task[1], 0)
             elif len(task) == 1:
                 if not task[0] == 4:
                     logger.error("Task is a tuple of length 1, but the first element is not 4, skipping")
-                    nosleep = True
                     continue
-            else:
-                logger.error(f"Task is a tuple of length {len(task)}, skipping")
-                nosleep = True
+            elif len(task) != 3:
+                logger.error("Task is a tuple of length %s, skipping", len(task))
                 continue
-            ratelimit.set(str(task[1]))
-            if ratelimit.get(str(task[1])) >=5: # window is 30s, which is 6 tasks, this requires at least 50% different tasks
-                logger.warning(f"Ratelimit hit for {task[1]}")
-                nosleep = True
+            if task[0] == 4: # every consumer gets its own termination task, so they skip the ratelimit and fail count, which key on the instance
+                await dispatch[4](task)
+                self.queue.task_done()
+                break
+            instance_id = self._identity(task[1])
+            if isinstance(task[1], Player):
+                self.pending_updates.discard((task[0], instance_id))
+            ratelimit_key = (type(task[1]).__name__, instance_id)
+            ratelimit.set(ratelimit_key)
+            if ratelimit.get(ratelimit_key) >=5: # no more than 5 tasks for the same instance in a 30s window
+                logger.warning("Ratelimit hit for %s", ratelimit_key)
                 continue # just discard the task
             #logger.debug(f"Processing task: {task}")
             # Initialize fail count
             fail_count = task[2] if len(task) > 2 else 0
             if fail_count > 5:
-                logger.error(f"Task {task} failed too many times, skipping")
-                nosleep = True
+                logger.error("Task %s failed too many times, skipping", (task[0], *ratelimit_key))
                 continue
 
+            handler = dispatch[task[0]] if task[0] in range(len(dispatch)) else None
+            if handler is None:
+                logger.error("Unknown task type: %s", task)
+                continue
             try:
-                result = await handlers.get(task[0], unknown_handler)(task)
+                # tasks for the same player are serialized, and the lock is held until the handler has committed, so e.g. two creates can't both send a dossier
+                async with (self._player_lock(instance_id) if isinstance(task[1], Player) else nullcontext()):
+                    async with self.worker_limiter:
+                        result = await handler(task)
                 #session.expunge(task[1]) # expunge the instance to avoid memory leak or stale commits
                 if result:
                     break
             except Exception as e:
-                logger.error(f"Error processing task: {e}")
+                logger.error("Error processing task: %s", e)
+                if isinstance(e, HTTPException) and e.status == 429:
+                    self.worker_limiter.throttle()
                 # Requeue the task with an incremented fail count
                 new_fail_count = fail_count + 1
                 if len(task) > 2:
                     task = (*task[:2], new_fail_count)  # Update fail count
                 else:
                     task = (*task, new_fail_count)  # Add fail count
-                self.queue.put_nowait(task)
+                self.enqueue(task)
             self.queue.task_done()
 
+    @asynccontextmanager
+    async def _player_lock(self, player_id: int):
+        """
+        Holds the lock for a player's queue tasks, dropping the lock once nobody holds or waits for it.
+        """
+        entry = self._player_locks.get(player_id)
+        if entry is None:
+            entry = self._player_locks[player_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._player_locks[player_id]
+
+    @staticmethod
+    def _identity(instance: Any) -> Any:
+        """
+        Returns the primary key of a model instance without loading it, so it works on detached and expired instances.
+
+        Returns None for anything that isn't a persisted model instance.
+        """
+        state = inspect(instance, raiseerr=False)
+        if state is None or state.identity is None:
+            return None
+        return state.identity[0]
+
+    def enqueue(self, task: tuple) -> bool:
+        """
+        Puts a task on the queue without blocking, dropping it if the queue is full.
+
+        This is for producers that can't await, such as the ORM listeners and the queue consumer itself,
+        which would deadlock waiting for room in its own queue. Async producers should `await self.queue.put(...)` instead.
+
+        Returns:
+            bool: True if the task was queued, False if it was dropped.
+        """
+        try:
+            self.queue.put_nowait(task)
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Queue is full, dropping task of type %s", task[0])
+            return False
+
+    def _enqueue_player(self, task_type: int, player: Player) -> bool:
+        """
+        Queues a task for the player, unless a task of the same type is already pending for them.
+
+        Returns:
+            bool: True if the task was queued, False if it was already pending or the queue is full.
+        """
+        key = (task_type, player.id)
+        if key in self.pending_updates:
+            return False
+        if not self.enqueue((task_type, player)):
+            return False
+        self.pending_updates.add(key)
+        return True
+
+    async def _cached_fetch_user(self, user_id: int | str, ttl: float = 3600) -> User:
+        """
+        Returns the user with the given id, reusing a previous lookup if it is younger than `ttl` seconds.
+
+        Prefers the gateway cache over a REST call, and keeps at most 500 users, evicting the oldest first.
+        """
+        user_id = int(user_id) # discord ids are stored as strings in the database
+        now = time.monotonic()
+        cached = self._user_cache.get(user_id)
+        if cached and now - cached[0] < ttl:
+            return cached[1]
+        user = self.get_user(user_id) or await self.fetch_user(user_id)
+        self._user_cache.pop(user_id, None) # re-insert so the entry moves to the end of the eviction order
+        self._user_cache[user_id] = (now, user)
+        if len(self._user_cache) > 500:
+            del self._user_cache[next(iter(self._user_cache))]
+        return user
+
+    def resolve_player(self, discord_id: int | str, session: Session) -> Player | None:
+        """
+        Returns the player for a discord id, loading it by primary key once the id is known so the identity map can answer.
+
+        Players that no longer exist are dropped from the cache and looked up again by discord id.
+        """
+        discord_id = int(discord_id)
+        player_id = self._player_id_by_discord.get(discord_id)
+        if player_id is not None:
+            player = session.get(Player, player_id)
+            if player is not None:
+                return player
+            del self._player_id_by_discord[discord_id] # the player was deleted since it was cached
+        player = session.query(Player).filter(Player.discord_id == discord_id).first()
+        if player is not None:
+            self._player_id_by_discord[discord_id] = player.id
+        return player
+
+    async def _pace(self, channel_id: int):
+        """
+        Waits for a token from the given channel's bucket before a Discord API call on that channel.
+
+        Each channel gets its own bucket, so the dossier and statistics channels are throttled independently.
+        """
+        bucket = self.channel_buckets.get(channel_id)
+        if bucket is None:
+            bucket = self.channel_buckets[channel_id] = TokenBucket(capacity=5, refill_per_sec=5)
+        await bucket.acquire()
+
+    async def _fetch_channel_message(self, channel: TextChannel, message_id: int | str | None):
+        """
+        Fetches a message from one of the queue's channels, pacing the request like any other call on that channel.
+
+        Returns None without making a request if there is no message id.
+        """
+        if message_id is None:
+            return None
+        await self._pace(channel.id)
+        try:
+            message = await channel.fetch_message(message_id)
+        except NotFound:
+            self._known_messages.pop(int(message_id), None)
+            raise
+        self._remember_message(message.id)
+        return message
+
+    async def _message_exists(self, channel: TextChannel, message_id: int | str | None) -> bool:
+        """
+        Checks whether a message exists, skipping the fetch if we have seen it alive before.
+        """
+        if message_id is None:
+            return False
+        if int(message_id) in self._known_messages:
+            return True
+        try:
+            return await self._fetch_channel_message(channel, message_id) is not None
+        except NotFound:
+            return False
+
+    def _remember_message(self, message_id: int):
+        """
+        Records a message as alive, keeping at most 10000 ids and evicting the oldest first.
+        """
+        self._known_messages[message_id] = None
+        if len(self._known_messages) > 10000:
+            del self._known_messages[next(iter(self._known_messages))]
+
     # we are going to start subdividing the queue consumer into multiple functions, for clarity
 
     async def _handle_create_task(self, task: tuple[int, Any], session: Session):
-        session.execute(text("SET SESSION innodb_lock_wait_timeout = 10"))
-        requeued = False
-        if task[1].id is None:
-            logger.error(f"Task has a None id, skipping")
+        instance_id = self._identity(task[1])
+        if instance_id is None:
+            logger.error("Task has a None id, skipping")
             return
-        instance  = session.query(task[1].__class__).filter(task[1].__class__.id == task[1].id).first()
-        if isinstance(instance, Player):
-            player = instance
-            if self.config.get("dossier_channel_id"):
-                medals = session.query(Medals).filter(Medals.player_id == player.id).all()
-                # identify what medals have known emotes
-                known_emotes = set(self.medal_emotes.keys())
-                known_medals = {medal.name for medal in medals if medal.name in known_emotes}
-                unknown_medals = {medal.name for medal in medals if medal.name not in known_emotes}
-                known_medals_list = list(known_medals)
-                # make rows of 5 medals that have known emotes
-                rows = [known_medals_list[i:i+5] for i in range(0, len(known_medals_list), 5)]
-                unknown_medals_list = list(unknown_medals)
-                unknown_text = "\n".join(unknown_medals_list)
-                # convert the rows to a string of emotes, with a space between each emote
-                medal_block = "\n".join([" ".join([self.medal_emotes[medal] for medal in row]) for row in rows]) + "\n" + unknown_text
-                mention = await self.fetch_user(player.discord_id)
-                mention = mention.mention if mention else ""
-                # check for an existing dossier message, if it exists, skip creation
-                create_dossier = True
-                existing_dossier = session.query(Dossier).filter(Dossier.player_id == player.id).first()
-                if existing_dossier:
-                    # check if the message itself actually exists
-                    channel = self.get_channel(self.config["dossier_channel_id"])
-                    if channel:
-                        message = await channel.fetch_message(existing_dossier.message_id)
-                        if message:
-                            logger.debug(f"Dossier message for player {player.id} already exists, skipping creation")
-                            create_dossier = False
-                if not player.id:
-                    logger.error(f"missing player id, skipping dossier creation")
-                    return
-                if create_dossier:
-                    dossier_message = await self.get_channel(self.config["dossier_channel_id"]).send(templates.Dossier.format(mention=mention, player=player, medals=medal_block))
+        instance = session.get(task[1].__class__, instance_id) # uses the identity map before querying
+        handler = self._create_dispatch.get(type(instance))
+        if handler:
+            await handler(instance, session)
+
+    async def _create_player(self, player: Player, session: Session):
+        if self.dossier_channel:
+            medals = session.query(Medals).filter(Medals.player_id == player.id).all()
+            # split the medals by whether they have known emotes, in a single pass
+            known_emotes = self.medal_emotes
+            known_medals_list = []
+            unknown_medals_list = []
+            for medal in medals:
+                (known_medals_list if medal.name in known_emotes else unknown_medals_list).append(medal.name)
+            # make rows of 5 emotes separated by spaces, straight from the known medals
+            rows = [" ".join(known_emotes[name] for name in known_medals_list[i:i+5]) for i in range(0, len(known_medals_list), 5)]
+            medal_block = "\n".join(rows) + "\n" + "\n".join(unknown_medals_list)
+            # check for an existing dossier message, if it exists, skip creation
+            create_dossier = True
+            # a stale row keeps its unique player_id, so it is reused below rather than added again
+            dossier = session.query(Dossier).filter(Dossier.player_id == player.id).first()
+            existing_message_id = dossier.message_id if dossier else None
+            # the user and the existing message are independent requests, so make them concurrently
+            mention, message_exists = await gather_all(
+                self._cached_fetch_user(player.discord_id),
+                self._message_exists(self.dossier_channel, existing_message_id))
+            mention = mention.mention if mention else ""
+            if message_exists:
+                logger.debug("Dossier message for player %s already exists, skipping creation", player.id)
+                create_dossier = False
+            if not player.id:
+                logger.error("missing player id, skipping dossier creation")
+                return
+            if create_dossier:
+                await self._pace(self.dossier_channel.id)
+                dossier_message = await self.dossier_channel.send(templates.Dossier_fmt(mention=mention, player=player, medals=medal_block))
+                self._remember_message(dossier_message.id)
+                if dossier:
+                    dossier.message_id = dossier_message.id
+                else:
                     dossier = Dossier(player_id=player.id, message_id=dossier_message.id)
                     session.add(dossier)
-                    logger.debug(f"Created dossier for player {player.id} with message ID {dossier_message.id}")
-            if self.config.get("statistics_channel_id"):
-                unit_message = await self.generate_unit_message(player)
-                _player = session.merge(player)
-                discord_id = _player.discord_id
-                mention = await self.fetch_user(discord_id)
-                mention = mention.mention if mention else ""
-                # check for an existing statistics message, if it exists, skip creation
-                existing_statistics = session.query(Statistic).filter(Statistic.player_id == _player.id).first()
-                if existing_statistics:
-                    # check if the message itself actually exists
-                    channel = self.get_channel(self.config["statistics_channel_id"])
-                    if channel:
-                        message = await channel.fetch_message(existing_statistics.message_id)
-                        if message:
-                            logger.debug(f"Statistics message for player {_player.id} already exists, skipping creation")
-                            return
-                if not _player.id:
-                    logger.error(f"missing player id, skipping statistics creation")
-                    return
-                statistics_message = await self.get_channel(self.config["statistics_channel_id"]).send(templates.Statistics_Player.format(mention=mention, player=_player, units=unit_message))
-                statistics = Statistic(player_id=_player.id, message_id=statistics_message.id)
+                logger.debug("Created dossier for player %s with message ID %s", player.id, dossier_message.id)
+        if self.statistics_channel:
+            # check for an existing statistics message, if it exists, skip creation
+            statistics = session.query(Statistic).filter(Statistic.player_id == player.id).first()
+            existing_message_id = statistics.message_id if statistics else None
+            # generate_unit_message runs in its own task under gather, so it gets its own session and leaves this one open
+            unit_message, mention, message_exists = await gather_all(
+                self.generate_unit_message(player),
+                self._cached_fetch_user(player.discord_id),
+                self._message_exists(self.statistics_channel, existing_message_id))
+            mention = mention.mention if mention else ""
+            if message_exists:
+                logger.debug("Statistics message for player %s already exists, skipping creation", player.id)
+                return
+            if not player.id:
+                logger.error("missing player id, skipping statistics creation")
+                return
+            await self._pace(self.statistics_channel.id)
+            statistics_message = await self.statistics_channel.send(templates.Statistics_Player_fmt(mention=mention, player=player, units=unit_message))
+            self._remember_message(statistics_message.id)
+            if statistics:
+                statistics.message_id = statistics_message.id
+            else:
+                statistics = Statistic(player_id=player.id, message_id=statistics_message.id)
                 session.add(statistics)
-                logger.debug(f"Created statistics for player {_player.id} with message ID {statistics_message.id}")
-        elif isinstance(instance, Unit):
-            player = session.query(Player).filter(Player.id == instance.player_id).first()
-            if player:
-                if not requeued:
-                    self.queue.put_nowait((1, player))
-                    logger.debug(f"Queued update task for player {player.id} due to unit {instance.id} Location 1")
-                    requeued = True
-                else:
-                    logger.debug(f"Already queued update task for player {player.id} due to unit {instance.id} Location 1")
+            logger.debug("Created statistics for player %s with message ID %s", player.id, statistics_message.id)
+
+    async def _create_unit(self, unit: Unit, session: Session):
+        player = session.query(Player).filter(Player.id == unit.player_id).first()
+        if player:
+            if self._enqueue_player(1, player):
+                logger.debug("Queued update task for player %s due to unit %s Location 1", player.id, unit.id)
             else:
-                logger.error(f"Player not found for unit {instance.id}")
-        elif isinstance(instance, PlayerUpgrade):
-            unit = session.query(Unit).filter(Unit.id == instance.unit_id).first()
-            player = session.query(Player).filter(Player.id == unit.player_id).first()
-            if player:
-                if not requeued:
-                    self.queue.put_nowait((1, player))
-                    logger.debug(f"Queued update task for player {player.id} due to upgrade {instance.id} Location 2")
-                    requeued = True
-                else:
-                    logger.debug(f"Already queued update task for player {player.id} due to upgrade {instance.id} Location 2")
+                logger.debug("Already queued update task for player %s due to unit %s Location 1", player.id, unit.id)
+        else:
+            logger.error("Player not found for unit %s", unit.id)
+
+    async def _create_upgrade(self, upgrade: PlayerUpgrade, session: Session):
+        unit = session.query(Unit).options(joinedload(Unit.player)).filter(Unit.id == upgrade.unit_id).first()
+        player = unit.player if unit else None
+        if player:
+            if self._enqueue_player(1, player):
+                logger.debug("Queued update task for player %s due to upgrade %s Location 2", player.id, upgrade.id)
+            else:
+                logger.debug("Already queued update task for player %s due to upgrade %s Location 2", player.id, upgrade.id)
 
     async def _handle_update_task(self, task: tuple[int, Any], session: Session):
-        session.execute(text("SET SESSION innodb_lock_wait_timeout = 10"))
-        instance = session.query(task[1].__class__).filter(task[1].__class__.id == task[1].id).first()
-        requeued = False
-        if isinstance(instance, Player):
-            logger.debug(f"Updating player: {instance}")
-            player = instance
-            logger.debug("fetching dossier")
-            dossier = session.query(Dossier).filter(Dossier.player_id == player.id).first()
-            if dossier:
-                logger.debug("dossier found, fetching channel")
-                channel = self.get_channel(self.config["dossier_channel_id"])
-                if channel:
-                    logger.debug("channel found, fetching message")
-                    message = await channel.fetch_message(dossier.message_id)
-                    logger.debug("message found, fetching user")
-                    mention = await self.fetch_user(player.discord_id)
-                    mention = mention.mention if mention else ""
-                    logger.debug("user found, editing message")
-                    await message.edit(content=templates.Dossier.format(mention=mention, player=player, medals=""))
-                    logger.debug(f"Updated dossier for player {player.id} with message ID {dossier.message_id}")
+        instance_id = self._identity(task[1])
+        if instance_id is None:
+            logger.error("Task has a None id, skipping")
+            return
+        instance = session.get(task[1].__class__, instance_id) # uses the identity map before querying
+        handler = self._update_dispatch.get(type(instance))
+        if handler:
+            await handler(instance, session)
+
+    async def _update_player(self, player: Player, session: Session):
+        logger.debug("Updating player: %s", player)
+        dossier_message_id = session.query(Dossier.message_id).filter(Dossier.player_id == player.id).scalar()
+        statistics_message_id = session.query(Statistic.message_id).filter(Statistic.player_id == player.id).scalar()
+        # the two messages are independent, and the unit message gets its own session, so both halves run concurrently
+        await gather_all(
+            self._update_dossier(player, dossier_message_id),
+            self._update_statistics(player, statistics_message_id))
+
+    async def _update_dossier(self, player: Player, dossier_message_id: str | None):
+        if dossier_message_id is not None:
+            logger.debug("dossier found, fetching channel")
+            channel = self.dossier_channel
+            if channel:
+                logger.debug("channel found, fetching message and user")
+                message, mention = await gather_all(
+                    self._fetch_channel_message(channel, dossier_message_id),
+                    self._cached_fetch_user(player.discord_id))
+                mention = mention.mention if mention else ""
+                logger.debug("user found, editing message")
+                await self._pace(channel.id)
+                await message.edit(content=templates.Dossier_fmt(mention=mention, player=player, medals=""))
+                logger.debug("Updated dossier for player %s with message ID %s", player.id, dossier_message_id)
+        else:
+            logger.debug("no dossier found, pushing create task")
+            if self._enqueue_player(0, player):
+                logger.debug("Queued create task for player %s due to missing dossier message Location 3", player.id)
             else:
-                logger.debug("no dossier found, pushing create task")
-                if not requeued:
-                    self.queue.put_nowait((0, player))
-                    logger.debug(f"Queued create task for player {player.id} due to missing dossier message Location 3")
-                    requeued = True
-                else:
-                    logger.debug(f"Already queued create task for player {player.id} due to missing dossier message Location 3")
-            statistics = session.query(Statistic).filter(Statistic.player_id == player.id).first()
-            if statistics:
-                channel = self.get_channel(self.config["statistics_channel_id"])
-                if channel:
-                    message = await channel.fetch_message(statistics.message_id)
-                    discord_id = player.discord_id
-                    unit_message = await self.generate_unit_message(player)
-                    _player = session.merge(player)
-                    _statistics = session.merge(statistics)
-                    mention = await self.fetch_user(discord_id)
-                    mention = mention.mention if mention else ""
-                    await message.edit(content=templates.Statistics_Player.format(mention=mention, player=_player, units=unit_message))
-                    logger.debug(f"Updated statistics for player {_player.id} with message ID {_statistics.message_id}")
-                else:
-                    # there should be a message, but the discord side was probably deleted by a mod
-                    logger.error(f"No channel found for statistics message of player {player.id}, skipping")
+                logger.debug("Already queued create task for player %s due to missing dossier message Location 3", player.id)
+
+    async def _update_statistics(self, player: Player, statistics_message_id: str | None):
+        if statistics_message_id is not None:
+            channel = self.statistics_channel
+            if channel:
+                message, unit_message, mention = await gather_all(
+                    self._fetch_channel_message(channel, statistics_message_id),
+                    self.generate_unit_message(player),
+                    self._cached_fetch_user(player.discord_id))
+                mention = mention.mention if mention else ""
+                await self._pace(channel.id)
+                await message.edit(content=templates.Statistics_Player_fmt(mention=mention, player=player, units=unit_message))
+                logger.debug("Updated statistics for player %s with message ID %s", player.id, statistics_message_id)
             else:
-                # user doesn't have a statistics message, push a create task on the user, to fudge it back
-                if not requeued:
-                    self.queue.put_nowait((0, player))
-                    logger.debug(f"Queued create task for player {player.id} due to missing statistics message Location 4")
-                    requeued = True
-                else:
-                    logger.debug(f"Already queued create task for player {player.id} due to missing statistics message Location 4")
-        elif isinstance(instance, Unit):
-            unit = instance
-            player = session.query(Player).filter(Player.id == unit.player_id).first()
-            if player:
-                if not requeued:
-                    self.queue.put_nowait((1, player))
-                    logger.debug(f"Queued update task for player {player.id} due to unit {unit.id} Location 5")
-                    requeued = True
-                else:
-                    logger.debug(f"Already queued update task for player {player.id} due to unit {unit.id} Location 5")
-        elif isinstance(task[1], PlayerUpgrade):
-            upgrade = task[1]
-            unit = session.query(Unit).filter(Unit.id == upgrade.unit_id).first()
-            player = session.query(Player).filter(Player.id == unit.player_id).first()
-            if player:
-                if not requeued:
-                    self.queue.put_nowait((1, player))
-                    logger.debug(f"Queued update task for player {player.id} due to upgrade {upgrade.id} Location 6")
-                    requeued = True
-                else:
-                    logger.debug(f"Already queued update task for player {player.id} due to upgrade {upgrade.id} Location 6")
+                # there should be a message, but the discord side was probably deleted by a mod
+                logger.error("No channel found for statistics message of player %s, skipping", player.id)
+        else:
+            # user doesn't have a statistics message, push a create task on the user, to fudge it back
+            if self._enqueue_player(0, player):
+                logger.debug("Queued create task for player %s due to missing statistics message Location 4", player.id)
+            else:
+                logger.debug("Already queued create task for player %s due to missing statistics message Location 4", player.id)
+
+    async def _update_unit(self, unit: Unit, session: Session):
+        player = session.query(Player).filter(Player.id == unit.player_id).first()
+        if player:
+            if self._enqueue_player(1, player):
+                logger.debug("Queued update task for player %s due to unit %s Location 5", player.id, unit.id)
+            else:
+                logger.debug("Already queued update task for player %s due to unit %s Location 5", player.id, unit.id)
+
+    async def _update_upgrade(self, upgrade: PlayerUpgrade, session: Session):
+        unit = session.query(Unit).options(joinedload(Unit.player)).filter(Unit.id == upgrade.unit_id).first()
+        player = unit.player if unit else None
+        if player:
+            if self._enqueue_player(1, player):
+                logger.debug("Queued update task for player %s due to upgrade %s Location 6", player.id, upgrade.id)
+            else:
+                logger.debug("Already queued update task for player %s due to upgrade %s Location 6", player.id, upgrade.id)
 
     async def _handle_delete_task(self, task: tuple[int, Any], session: Session):
-        session.execute(text("SET SESSION innodb_lock_wait_timeout = 10"))
-        logger.debug(f"requerying instance for delete task")
-        with session.no_autoflush: # disable flush on delete, to avoid a reinsert
-            instance = session.query(task[1].__class__).filter(task[1].__class__.id == task[1].id).first()
-        logger.debug(f"instance found for delete task: {instance}") # we can't log the task as it's possibly unbound, but we can log the instance
-        requeued = False
-        if isinstance(instance, Dossier):
-            dossier = instance
-            channel = self.get_channel(self.config["dossier_channel_id"])
-            if channel:
-                message = await channel.fetch_message(dossier.message_id)
-                await message.delete()
-                logger.debug(f"Deleted dossier message ID {dossier.message_id} for player {dossier.player_id}")
-        elif isinstance(instance, Statistic):
-            statistic = instance
-            channel = self.get_channel(self.config["statistics_channel_id"])
-            if channel:
-                message = await channel.fetch_message(statistic.message_id)
-                await message.delete()
-                logger.debug(f"Deleted statistics message ID {statistic.message_id} for player {statistic.player_id}")
-        elif isinstance(instance, Unit):
-            logger.debug(f"instance is a unit, expunging")
-            session.expunge(instance)
+        logger.debug("requerying instance for delete task")
+        instance_id = self._identity(task[1])
+        if instance_id is None:
+            logger.error("Task has a None id, skipping")
             return
-            unit = instance
-            player = session.query(Player).filter(Player.id == unit.player_id).first()
-            if player:
-                if not requeued:
-                    self.queue.put_nowait((1, player))
-                    logger.debug(f"Queued update task for player {player.id} due to unit {unit.id} Location 7")
-                    requeued = True
-                else:
-                    logger.debug(f"Already queued update task for player {player.id} due to unit {unit.id} Location 7")
-        elif isinstance(instance, PlayerUpgrade):
-            upgrade = instance
-            unit = session.query(Unit).filter(Unit.id == upgrade.unit_id).first()
-            player = session.query(Player).filter(Player.id == unit.player_id).first()
-            if player:
-                if not requeued:
-                    self.queue.put_nowait((1, player))
-                    logger.debug(f"Queued update task for player {player.id} due to upgrade {upgrade.id} Location 8")
-                    requeued = True
-                else:
-                    logger.debug(f"Already queued update task for player {player.id} due to upgrade {upgrade.id} Location 8")
+        with session.no_autoflush: # disable flush on delete, to avoid a reinsert
+            instance = session.get(task[1].__class__, instance_id)
+        logger.debug("instance found for delete task: %s", instance) # we can't log the task as it's possibly unbound, but we can log the instance
+        handler = self._delete_dispatch.get(type(instance))
+        if handler:
+            await handler(instance, session)
         if instance: # if the instance is not None, we need to expunge it, if the instance is None we can ignore it
             session.expunge(instance)
 
+    async def _delete_dossier(self, dossier: Dossier, session: Session):
+        channel = self.dossier_channel
+        if channel:
+            await self._pace(channel.id)
+            message = await channel.fetch_message(dossier.message_id)
+            await self._pace(channel.id)
+            await message.delete()
+            logger.debug("Deleted dossier message ID %s for player %s", dossier.message_id, dossier.player_id)
+
+    async def _delete_statistic(self, statistic: Statistic, session: Session):
+        channel = self.statistics_channel
+        if channel:
+            await self._pace(channel.id)
+            message = await channel.fetch_message(statistic.message_id)
+            await self._pace(channel.id)
+            await message.delete()
+            logger.debug("Deleted statistics message ID %s for player %s", statistic.message_id, statistic.player_id)
+
+    async def _delete_upgrade(self, upgrade: PlayerUpgrade, session: Session):
+        unit = session.query(Unit).options(joinedload(Unit.player)).filter(Unit.id == upgrade.unit_id).first()
+        player = unit.player if unit else None
+        if player:
+            if self._enqueue_player(1, player):
+                logger.debug("Queued update task for player %s due to upgrade %s Location 8", player.id, upgrade.id)
+            else:
+                logger.debug("Already queued update task for player %s due to upgrade %s Location 8", player.id, upgrade.id)
+
     async def _handle_terminate_task(self, task): 
         logger.debug("Queue consumer terminating")
         return True # this is the only function that returns a value, as that's how we'll know to terminate, is if a value or raise is returned
@@ -450,22 +636,21 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         Returns:
             str: Formatted unit messages for the player, grouped by status.
         """
-        logger.debug(f"Generating unit message for player: {player.id}")
+        logger.debug("Generating unit message for player: %s", player.id)
         unit_messages = []
 
-        # Query inactive units
-        units = session.query(Unit).filter(Unit.player_id == player.id).all()
-        logger.debug(f"Found {len(units)} units for player: {player.id}")
+        # Query all units, loading their upgrades in one batched SELECT rather than one per unit
+        units = session.query(Unit).options(selectinload(Unit.upgrades)).filter(Unit.player_id == player.id).all()
+        logger.debug("Found %s units for player: %s", len(units), player.id)
         for unit in units:
-            upgrades = session.query(PlayerUpgrade).filter(PlayerUpgrade.unit_id == unit.id).all()
-            upgrade_list = ", ".join([upgrade.name for upgrade in upgrades])
-            logger.debug(f"Unit {unit.name} of type {unit.unit_type} has status {unit.status.name}")
-            logger.debug(f"Unit {unit.id} has upgrades: {upgrade_list}")
-            unit_messages.append(templates.Statistics_Unit.format(unit=unit, upgrades=upgrade_list, callsign=('\"' + unit.callsign + '\"') if unit.callsign else ""))
+            upgrade_list = ", ".join([upgrade.name for upgrade in unit.upgrades])
+            logger.debug("Unit %s of type %s has status %s", unit.name, unit.unit_type, unit.status.name)
+            logger.debug("Unit %s has upgrades: %s", unit.id, upgrade_list)
+            unit_messages.append(templates.Statistics_Unit_fmt(unit=unit, upgrades=upgrade_list, callsign=('\"' + unit.callsign + '\"') if unit.callsign else ""))
 
         # Combine all unit messages into a single string
         combined_message = "\n".join(unit_messages)
-        logger.debug(f"Generated unit message for player {player.id}: {combined_message}")
+        logger.debug("Generated unit message for player %s: %s", player.id, combined_message)
         return combined_message
 
     async def load_extensions(self, extensions: list[str]):
@@ -498,7 +683,11 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         """
         logger.info(f"Logged in as {self.user}")
         #await self.set_bot_nick("S.A.M.")
-        asyncio.create_task(self.queue_consumer())
+        self.resolve_channels()
+        if not self._consumers_started: # on_ready runs again after every reconnect, the consumers only need starting once
+            self._consumers_started = True
+            for _ in range(self.max_workers):
+                asyncio.create_task(self.queue_consumer())
         await self.change_presence(status=Status.online, activity=Activity(name="Meta Campaign", type=ActivityType.playing))
         if (getenv("STARTUP_ANIMATION", "false").lower() == "true"):
             try:
@@ -525,7 +714,7 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         logger.debug("Starting 24 hour notification loop")
         await asyncio.sleep(24 * 60 * 60)
         channel = await self.fetch_channel(1211454073383952395)
-        owner = await self.fetch_user(533009808501112881)
+        owner = await self._cached_fetch_user(533009808501112881)
         await channel.send(f"{owner.mention}\n# I have successfully survived 24 Hours!")
         logger.debug("24 hour notification loop finished")
         self.notify_on_24_hours.cancel()
@@ -537,7 +726,8 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         Puts a termination signal in the queue, resyncs configuration, commits database changes,
         and closes the session.
         """
-        await self.queue.put((4, None))
+        for _ in range(self.max_workers): # one termination task per queue consumer
+            await self.queue.put((4, None))
         await self.resync_config(session=session)
         await self.change_presence(status=Status.offline, activity=None)
         await super().close()
@@ -584,14 +774,29 @@ class CustomClient(Bot): # need to inherit from Bot to use Cogs
         await self.tree.sync()
         logger.debug("Slash commands synced")
 
+        if hasattr(signal, "SIGHUP"): # SIGHUP doesn't exist on windows
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self._reload_banned_users)
+            except NotImplementedError:
+                logger.warning("Signal handlers are not supported on this event loop, banned users will only load at startup")
+
         # wrap all the consumer methods in uses_db now, since we can access the sessionmaker after init
-        decorator = uses_db(sessionmaker=self.sessionmaker)
+        # the consumers run concurrently, so each asyncio task gets its own session rather than sharing the thread's
+        decorator = uses_db(sessionmaker=self.sessionmaker, scopefunc=asyncio.current_task)
         self.queue_consumer = decorator(self.queue_consumer)
         self._handle_create_task = decorator(self._handle_create_task)
         self._handle_update_task = decorator(self._handle_update_task)
         self._handle_delete_task = decorator(self._handle_delete_task)
         self.generate_unit_message = decorator(self.generate_unit_message)
         self.close = decorator(self.close)
+        # indexed by task type, built after wrapping so the consumers dispatch to the decorated handlers
+        self._task_dispatch = (
+            self._handle_create_task,
+            self._handle_update_task,
+            self._handle_delete_task,
+            None,
+            self._handle_terminate_task
+        )
         
     async def start(self, *args, **kwargs):
         """
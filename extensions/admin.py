@@ -5,10 +5,15 @@ from discord.ui import Modal, TextInput
 from models import Player, Unit, UnitStatus, PlayerUpgrade, Medals
 from customclient import CustomClient
 import os
+import asyncio
 from utils import has_invalid_url, uses_db, string_to_list
+from sqlalchemy import select, bindparam
 from sqlalchemy.orm import Session
 logger = getLogger(__name__)
 
+# a plain select is cached by SQLAlchemy's compiled cache, a lambda_stmt would be rebuilt every time by Unit's subquery loaders
+_ACTIVATE_LOOKUP = select(Unit).where(Unit.name.in_(bindparam("names", expanding=True)))
+
 class Admin(GroupCog, group_name="admin", name="Admin"):
     """
     Admin commands for managing players, units, points, and medals in the bot.
@@ -19,6 +24,7 @@ class Admin(GroupCog, group_name="admin", name="Admin"):
         """
         super().__init__()
         self.bot = bot
+        self._mod_role_ids = frozenset(self.bot.mod_roles)
         if os.getenv("PROD", False):
             self.interaction_check = self._is_mod
 
@@ -28,7 +34,7 @@ class Admin(GroupCog, group_name="admin", name="Admin"):
         """
         Check if the user is a moderator with the necessary role.
         """
-        valid = any(interaction.user.get_role(role) for role in self.bot.mod_roles)
+        valid = not self._mod_role_ids.isdisjoint(role.id for role in interaction.user.roles)
         if not valid:
             logger.warning(f"{interaction.user.name} tried to use admin commands")
         return valid
@@ -82,16 +88,17 @@ class Admin(GroupCog, group_name="admin", name="Admin"):
         """
         Adjusts a player's requisition points by adding or removing a specified amount.
         """
-        # find the player by discord id
-        player = session.query(Player).filter(Player.discord_id == player.id).first()
-        if not player:
+        # find the player by discord id, player stays the discord member so the response names them
+        db_player = self.bot.resolve_player(player.id, session)
+        if not db_player:
             await interaction.response.send_message("User doesn't have a Meta Campaign company", ephemeral=self.bot.use_ephemeral)
             return
         
-        # update the player's rec points
-        player.rec_points += points
-        logger.debug(f"User {player.name} now has {player.rec_points} requisition points")
-        await interaction.response.send_message(f"{player.name} now has {player.rec_points} requisition points", ephemeral=self.bot.use_ephemeral)
+        # update the player's rec points in SQL, so concurrent changes can't overwrite each other, the ORM still fires the update events
+        db_player.rec_points = Player.rec_points + points
+        session.commit() # commit before responding, so the refresh queued by the update event sees the new value, which is loaded back on the next access
+        logger.debug(f"User {player.display_name} now has {db_player.rec_points} requisition points")
+        await interaction.response.send_message(f"{player.display_name} now has {db_player.rec_points} requisition points", ephemeral=self.bot.use_ephemeral)
 
     @ac.command(name="bonuspay", description="Give or remove a number of bonus pay from a player")
     @ac.describe(player="The player to give or remove bonus pay from")
@@ -105,16 +112,17 @@ class Admin(GroupCog, group_name="admin", name="Admin"):
         """
         Modify a player's bonus pay by adding or removing a specified amount.
         """
-        # find the player by discord id
-        player = session.query(Player).filter(Player.discord_id == player.id).first()
-        if not player:
+        # find the player by discord id, player stays the discord member so the response names them
+        db_player = self.bot.resolve_player(player.id, session)
+        if not db_player:
             await interaction.response.send_message("User doesn't have a Meta Campaign company", ephemeral=self.bot.use_ephemeral)
             return
         
-        # update the player's bonus pay
-        player.bonus_pay += points
-        logger.debug(f"User {player.name} now has {player.bonus_pay} bonus pay")
-        await interaction.response.send_message(f"{player.name} now has {player.bonus_pay} bonus pay", ephemeral=self.bot.use_ephemeral)
+        # update the player's bonus pay in SQL, so concurrent changes can't overwrite each other, the ORM still fires the update events
+        db_player.bonus_pay = Player.bonus_pay + points
+        session.commit() # commit before responding, so the refresh queued by the update event sees the new value, which is loaded back on the next access
+        logger.debug(f"User {player.display_name} now has {db_player.bonus_pay} bonus pay")
+        await interaction.response.send_message(f"{player.display_name} now has {db_player.bonus_pay} bonus pay", ephemeral=self.bot.use_ephemeral)
 
     #@ac.command(name="activateunits", description="Activate multiple units")
     async def activateunits(self, interaction: Interaction):
@@ -134,8 +142,12 @@ class Admin(GroupCog, group_name="admin", name="Admin"):
             logger.debug(f"Parsed unit names: {unit_names}")
             activated = []
             not_found = []
+            # resolve all the names in one query, keeping the first unit found for each name
+            units: dict[str, Unit] = {}
+            for unit in session.execute(_ACTIVATE_LOOKUP, {"names": unit_names}).scalars():
+                units.setdefault(unit.name, unit)
             for unit_name in unit_names:
-                unit = session.query(Unit).filter(Unit.name == unit_name).first()
+                unit = units.get(unit_name)
                 if unit:
                     activated.append(unit.name)
                     unit.active = True
@@ -145,11 +157,12 @@ class Admin(GroupCog, group_name="admin", name="Admin"):
                 else:
                     not_found.append(unit_name)
                     logger.debug(f"Unit not found: {unit_name}")
-                try:
-                    session.commit()
-                except Exception as e:
-                    logger.error(f"Error committing to database: {e}")
-                    await interaction.response.send_message(f"Error committing to database: {e}", ephemeral=self.bot.use_ephemeral)
+            try:
+                session.commit()
+            except Exception as e:
+                logger.error(f"Error committing to database: {e}")
+                await interaction.response.send_message(f"Error committing to database: {e}", ephemeral=self.bot.use_ephemeral)
+                return
             await interaction.response.send_message(f"Activated {activated}, not found {not_found}", ephemeral=self.bot.use_ephemeral)
             logger.debug(f"Activation results - Activated: {activated}, Not found: {not_found}")
         modal.on_submit = modal_callback
@@ -225,8 +238,20 @@ class Admin(GroupCog, group_name="admin", name="Admin"):
         Refreshes the statistics and dossiers for all players.
         """
         await interaction.response.send_message("Refreshing statistics and dossiers for all players", ephemeral=self.bot.use_ephemeral)
-        for player in session.query(Player).all():
-            self.bot.queue.put_nowait((1, player)) # make the bot think the player was edited, using nowait to avoid yielding control
+        queue = self.bot.queue
+        # only the ids are read up front, the players are loaded 500 at a time, and each batch is fully fetched
+        # and its transaction ended before anything waits on the queue, so no cursor or connection is held across the wait
+        player_ids = session.scalars(select(Player.id).order_by(Player.id)).all()
+        for start in range(0, len(player_ids), 500):
+            players = session.query(Player).filter(Player.id.in_(player_ids[start:start + 500])).all()
+            session.commit() # nothing was changed, this just hands the connection back to the pool
+            for index, player in enumerate(players):
+                try:
+                    queue.put_nowait((1, player)) # make the bot think the player was edited
+                except asyncio.QueueFull:
+                    await queue.put((1, player)) # the queue is bounded, so wait for the consumers to make room
+                if index & 255 == 255:
+                    await asyncio.sleep(0) # let other coroutines run between batches
         await interaction.followup.send("Refreshed statistics and dossiers for all players", ephemeral=self.bot.use_ephemeral)
     
     @ac.command(name="refresh_player", description="Refresh the statistics and dossiers for a player")
@@ -245,7 +270,7 @@ class Admin(GroupCog, group_name="admin", name="Admin"):
         if not _player:
             await interaction.response.send_message("Player does not have a Meta Campaign company", ephemeral=self.bot.use_ephemeral)
             return
-        self.bot.queue.put_nowait((1, _player))
+        await self.bot.queue.put((1, _player))
 
     @ac.command(name="specialupgrade", description="Give a player a one-off or relic item")
     @ac.describe(player="The player to give the item to")
@@ -304,10 +329,15 @@ class Admin(GroupCog, group_name="admin", name="Admin"):
                 if not unit:
                     await interaction.response.send_message("Unit not found", ephemeral=self.bot.use_ephemeral)
                     return
-                self.bot.queue.put_nowait((2, unit))
+                unit_name, player_id = unit.name, unit.player_id
                 session.delete(unit)
+                session.commit() # commit before queueing, so the refresh no longer lists the unit
                 logger.debug(f"Unit with the id {unit_id} was deleted from player {player.name}")
-                await interaction.response.send_message(f"Unit {unit.name} has been removed", ephemeral=self.bot.use_ephemeral)
+                await interaction.response.send_message(f"Unit {unit_name} has been removed", ephemeral=self.bot.use_ephemeral)
+                # units have no delete listener, so refresh the owner directly, after responding as the queue may make us wait for room
+                owner = session.get(Player, player_id)
+                if owner:
+                    await self.bot.queue.put((1, owner))
                 
 
         # Checks if the Player has a Meta Company and If that company has a name
@@ -486,7 +516,6 @@ async def setup(_bot: Bot):
     bot = _bot
     logger.info("Setting up Admin cog")
     await bot.add_cog(Admin(bot))
-    await bot.tree.sync()
 
 async def teardown():
     """
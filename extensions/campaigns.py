@@ -1,8 +1,9 @@
 from logging import getLogger
 from discord.ext.commands import GroupCog, Bot
 from discord import Interaction, app_commands as ac, Member, Role, Embed
-from models import Campaign, UnitStatus, CampaignInvite, Player
+from models import Campaign, UnitStatus, CampaignInvite, Player, Unit
 from utils import uses_db
+from sqlalchemy import update, select, func, case
 from sqlalchemy.orm import Session
 from customclient import CustomClient
 logger = getLogger(__name__)
@@ -157,12 +158,19 @@ class Campaigns(GroupCog):
             logger.error(f"{interaction.user.name} does not have permission to payout campaign {campaign}")
             await interaction.response.send_message("You don't have permission to payout this campaign", ephemeral=True)
             return
-        # payout all players in the campaign
-        for unit in _campaign.units:
-            unit.player.rec_points += base
-            if unit.status == UnitStatus.ACTIVE:
-                unit.player.rec_points += survivor
+        # payout all players in the campaign in one UPDATE, each unit pays base, and surviving units also pay survivor
+        player_ids = select(Unit.player_id).where(Unit.campaign_id == _campaign.id)
+        payout = select(func.sum(case((Unit.status == UnitStatus.ACTIVE, base + survivor), else_=base))) \
+            .where(Unit.campaign_id == _campaign.id, Unit.player_id == Player.id).scalar_subquery()
+        session.execute(update(Player).where(Player.id.in_(player_ids)).values(rec_points=Player.rec_points + payout)
+                        .execution_options(synchronize_session=False))
+        # commit before queueing anything, so the consumers render the paid amounts
+        session.commit()
+        paid_players = session.query(Player).filter(Player.id.in_(player_ids)).all()
         await interaction.response.send_message(f"Campaign {campaign} payout complete", ephemeral=True)
+        # a bulk UPDATE skips the ORM update events, so queue the refreshes they would have, after responding as the queue may make us wait for room
+        for _player in paid_players:
+            await self.bot.queue.put((1, _player))
 
     @ac.command(name="invite", description="Invite a player to a campaign")
     @ac.check(is_gm)
@@ -99,8 +99,8 @@ class Company(GroupCog):
         if not player:
             await interaction.response.send_message("You don't have a Meta Campaign company", ephemeral=CustomClient().use_ephemeral)
             return
-        self.bot.queue.put_nowait((1, player))
         await interaction.response.send_message("Your Meta Campaign company has been refreshed", ephemeral=CustomClient().use_ephemeral)
+        await self.bot.queue.put((1, player)) # after responding, as the queue may make us wait for room
 
 bot: Bot = None
 async def setup(_bot: Bot):
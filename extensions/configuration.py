@@ -48,15 +48,15 @@ class Config(GroupCog):
             await interaction.response.send_message("This command can only be used in a text channel", ephemeral=self.bot.use_ephemeral)
             return
         self.bot.config["dossier_channel_id"] = interaction.channel.id
-        await self.bot.resync_config()
+        await self.bot.resync_config(session)
         logger.info(f"Dossier channel set to {interaction.channel.name}")
         old_dossiers = session.query(Dossier).all()
         for dossier in old_dossiers:
             session.delete(dossier)
         session.commit()
-        for player in session.query(Player).all():
-            self.bot.queue.put_nowait((0, player))
         await interaction.response.send_message(f"Dossier channel set to {interaction.channel.mention}", ephemeral=self.bot.use_ephemeral)
+        for player in session.query(Player).all(): # respond first, as the queue may make us wait for room
+            await self.bot.queue.put((0, player))
 
     @ac.command(name="setstatistics", description="Set the statistics channel to the current channel")
     @uses_db(CustomClient().sessionmaker)
@@ -65,15 +65,15 @@ class Config(GroupCog):
             await interaction.response.send_message("This command can only be used in a text channel", ephemeral=self.bot.use_ephemeral)
             return
         self.bot.config["statistics_channel_id"] = interaction.channel.id
-        await self.bot.resync_config()
+        await self.bot.resync_config(session)
         logger.info(f"Statistics channel set to {interaction.channel.name}")
         old_statistics = session.query(Statistic).all()
         for statistic in old_statistics:
             session.delete(statistic)
         session.commit()
-        for player in session.query(Player).all():
-            self.bot.queue.put_nowait((0, player))
         await interaction.response.send_message(f"Statistics channel set to {interaction.channel.mention}", ephemeral=self.bot.use_ephemeral)
+        for player in session.query(Player).all(): # respond first, as the queue may make us wait for room
+            await self.bot.queue.put((0, player))
 
     @ac.command(name="list_configs", description="List all configurations")
     @uses_db(CustomClient().sessionmaker)
@@ -3,24 +3,95 @@ from discord.ext.commands import GroupCog, Bot
 from discord import Interaction, app_commands as ac, ui, SelectOption, TextStyle
 from models import Faq as Faq_model
 from templates import faq_response
-from utils import uses_db, chunk_list
+from utils import uses_db, uses_db_readonly, chunk_list
 from customclient import CustomClient
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 logger = getLogger(__name__)
+_sm = CustomClient().sessionmaker # looked up once, the decorators below run at import and in every command call
+_ANSWERERS: frozenset[int] = frozenset({533009808501112881, 805560300258590753, 379951076343939072})
 
 async def is_answerer(interaction: Interaction):
         """
         Checks if the user is an answerer
         """
-        valid = interaction.user.id in {533009808501112881, 805560300258590753, 379951076343939072}
+        valid = interaction.user.id in _ANSWERERS
         if not valid:
             await interaction.response.send_message("You are not authorized to use this command", ephemeral=True)
         return valid
 
+# the dropdowns are defined once here rather than in each command, so their callbacks are only decorated at import
+class FaqViewDropdown(ui.Select):
+    @uses_db_readonly(_sm)
+    async def callback(self, interaction: Interaction, session: Session):
+        selected_question = session.query(Faq_model).filter(Faq_model.id == int(self.values[0])).first()
+        await interaction.response.send_message(faq_response.format(selected=selected_question), ephemeral=True)
+
+class FaqRemoveDropdown(ui.Select):
+    def __init__(self, faq_cog: "Faq", *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.faq_cog = faq_cog
+
+    @uses_db(_sm)
+    async def callback(self, interaction: Interaction, session: Session):
+        selected_question = session.query(Faq_model).filter(Faq_model.id == int(self.values[0])).first()
+        session.delete(selected_question)
+        await interaction.response.send_message("Question removed from the FAQ", ephemeral=True)
+        self.faq_cog._invalidate_cache()
+
+class FaqEditDropdown(ui.Select):
+    def __init__(self, faq_cog: "Faq", *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.faq_cog = faq_cog
+
+    @uses_db(_sm)
+    async def callback(self, interaction: Interaction, session: Session):
+        selected_question = session.query(Faq_model).filter(Faq_model.id == int(self.values[0])).first()
+        # send a modal for the question and answer
+        modal = ui.Modal(title="Edit a question in the FAQ")
+        question = ui.TextInput(label="Question", placeholder="Enter the question here", max_length=255, default=selected_question.question)
+        answer = ui.TextInput(label="Answer", placeholder="Enter the answer here", style=TextStyle.paragraph, max_length=500, default=selected_question.answer)
+        modal.add_item(question)
+        modal.add_item(answer)
+        faq_cog = self.faq_cog
+        @uses_db(_sm)
+        async def modal_callback(interaction: Interaction, session: Session):
+            selected_question.question = question.value
+            selected_question.answer = answer.value
+            await interaction.response.send_message("Question edited in the FAQ", ephemeral=True)
+            faq_cog._invalidate_cache()
+        modal.on_submit = modal_callback
+        await interaction.response.send_modal(modal)
+
 class Faq(GroupCog):
     def __init__(self, bot: Bot):
         self.bot = bot
- 
+        self._faq_cache: list[tuple[int, str]] | None = None # (id, question) pairs in id order, None until loaded or after a change
+        self._option_chunks_cache: list[list[SelectOption]] | None = None
+
+    def _get_faq(self, session: Session) -> list[tuple[int, str]]:
+        """
+        Returns the FAQ questions as (id, question) pairs, only querying them when the cache is empty
+        """
+        if self._faq_cache is None:
+            self._faq_cache = [(faq_id, question) for faq_id, question in session.execute(select(Faq_model.id, Faq_model.question).order_by(Faq_model.id))]
+        return self._faq_cache
+
+    def _get_option_chunks(self, session: Session) -> list[list[SelectOption]]:
+        """
+        Returns the FAQ questions as select options, in chunks of 25 to fit in a dropdown
+        """
+        if self._option_chunks_cache is None:
+            faq_options = [SelectOption(label=question, value=str(faq_id)) for faq_id, question in self._get_faq(session)]
+            self._option_chunks_cache = chunk_list(faq_options, 25)
+        return self._option_chunks_cache
+
+    def _invalidate_cache(self):
+        """
+        Drops the cached questions, call this last in anything that changes the FAQ so nothing can reload them before the commit
+        """
+        self._faq_cache = None
+        self._option_chunks_cache = None
 
     @ac.command(name="how", description="How to use the FAQ")
     async def how(self, interaction: Interaction):
@@ -31,25 +102,16 @@ class Faq(GroupCog):
 
     
     @ac.command(name="view", description="View the FAQ")
-    @uses_db(CustomClient().sessionmaker)
+    @uses_db_readonly(_sm)
     async def view(self, interaction: Interaction, session: Session):
         """
         Displays the FAQ for S.A.M.
         """
-        faq_questions = session.query(Faq_model).all()
-        if not faq_questions:
+        faq_chunks = self._get_option_chunks(session)
+        if not faq_chunks:
             await interaction.response.send_message("No FAQ questions found", ephemeral=True)
             return
-        faq_options = [SelectOption(label=question.question, value=str(question.id)) for question in faq_questions]
-        faq_chunks = chunk_list(faq_options, 25)
-        class FaqDropdown(ui.Select):
-            def __init__(self, *args, **kwargs):
-                super().__init__(*args, **kwargs)
-            @uses_db(CustomClient().sessionmaker)
-            async def callback(self, interaction: Interaction, session: Session):
-                selected_question = session.query(Faq_model).filter(Faq_model.id == int(self.values[0])).first()
-                await interaction.response.send_message(faq_response.format(selected=selected_question), ephemeral=True)
-        faq_dropdowns = [FaqDropdown(placeholder="Select a question", options=chunk) for chunk in faq_chunks]
+        faq_dropdowns = [FaqViewDropdown(placeholder="Select a question", options=chunk) for chunk in faq_chunks]
         view = ui.View()
         for dropdown in faq_dropdowns:
             view.add_item(dropdown)
@@ -57,14 +119,14 @@ class Faq(GroupCog):
 
     @ac.command(name="add", description="Add a question to the FAQ")
     @ac.check(is_answerer)
-    @uses_db(CustomClient().sessionmaker)
+    @uses_db(_sm)
     async def add(self, interaction: Interaction, session: Session):
         """
         Adds a question to the FAQ
         """
         # send a modal for the question and answer
         # check if 125 questions already exist
-        if session.query(Faq_model).count() >= 125:
+        if len(self._get_faq(session)) >= 125: # the cached questions answer this without a COUNT once loaded
             await interaction.response.send_message("You cannot add more than 125 questions to the FAQ", ephemeral=True)
             return
         modal = ui.Modal(title="Add a question to the FAQ")
@@ -72,36 +134,27 @@ class Faq(GroupCog):
         answer = ui.TextInput(label="Answer", placeholder="Enter the answer here", style=TextStyle.paragraph, max_length=500)
         modal.add_item(question)
         modal.add_item(answer)
-        @uses_db(CustomClient().sessionmaker)
+        @uses_db(_sm)
         async def modal_callback(interaction: Interaction, session: Session):
             session.add(Faq_model(question=question.value, answer=answer.value))
             await interaction.response.send_message("Question added to the FAQ", ephemeral=True)
+            self._invalidate_cache()
         modal.on_submit = modal_callback
         await interaction.response.send_modal(modal)
 
     @ac.command(name="remove", description="Remove a question from the FAQ")
     @ac.check(is_answerer)
-    @uses_db(CustomClient().sessionmaker)
+    @uses_db_readonly(_sm)
     async def remove(self, interaction: Interaction, session: Session):
         """
         Removes a question from the FAQ
         """
         # send a dropdown with the questions
-        faq_questions = session.query(Faq_model).all()
-        if not faq_questions:
+        faq_chunks = self._get_option_chunks(session)
+        if not faq_chunks:
             await interaction.response.send_message("No FAQ questions found", ephemeral=True)
             return
-        faq_options = [SelectOption(label=question.question, value=str(question.id)) for question in faq_questions]
-        faq_chunks = chunk_list(faq_options, 25)
-        class FaqDropdown(ui.Select):
-            def __init__(self, *args, **kwargs):
-                super().__init__(*args, **kwargs)
-            @uses_db(CustomClient().sessionmaker)
-            async def callback(self, interaction: Interaction, session: Session):
-                selected_question = session.query(Faq_model).filter(Faq_model.id == int(self.values[0])).first()
-                session.delete(selected_question)
-                await interaction.response.send_message("Question removed from the FAQ", ephemeral=True)
-        faq_dropdowns = [FaqDropdown(placeholder="Select a question", options=chunk) for chunk in faq_chunks]
+        faq_dropdowns = [FaqRemoveDropdown(self, placeholder="Select a question", options=chunk) for chunk in faq_chunks]
         view = ui.View()
         for dropdown in faq_dropdowns:
             view.add_item(dropdown)
@@ -109,52 +162,29 @@ class Faq(GroupCog):
 
     @ac.command(name="edit", description="Edit a question in the FAQ")
     @ac.check(is_answerer)
-    @uses_db(CustomClient().sessionmaker)
+    @uses_db_readonly(_sm)
     async def edit(self, interaction: Interaction, session: Session):
         """
         Edits a question in the FAQ
         """
         # send a dropdown with the questions
-        faq_questions = session.query(Faq_model).all()
-        if not faq_questions:
+        faq_chunks = self._get_option_chunks(session)
+        if not faq_chunks:
             await interaction.response.send_message("No FAQ questions found", ephemeral=True)
             return
-        faq_options = [SelectOption(label=question.question, value=str(question.id)) for question in faq_questions]
-        faq_chunks = chunk_list(faq_options, 25)
-        class FaqDropdown(ui.Select):
-            def __init__(self, *args, **kwargs):
-                super().__init__(*args, **kwargs)
-
-            @uses_db(CustomClient().sessionmaker)
-            async def callback(self, interaction: Interaction, session: Session):
-                selected_question = session.query(Faq_model).filter(Faq_model.id == int(self.values[0])).first()
-                # send a modal for the question and answer
-                modal = ui.Modal(title="Edit a question in the FAQ")
-                question = ui.TextInput(label="Question", placeholder="Enter the question here", max_length=255, default=selected_question.question)
-                answer = ui.TextInput(label="Answer", placeholder="Enter the answer here", style=TextStyle.paragraph, max_length=500, default=selected_question.answer)
-                modal.add_item(question)
-                modal.add_item(answer)
-                @uses_db(CustomClient().sessionmaker)
-                async def modal_callback(interaction: Interaction, session: Session):
-                    selected_question.question = question.value
-                    selected_question.answer = answer.value
-                    await interaction.response.send_message("Question edited in the FAQ", ephemeral=True)
-                modal.on_submit = modal_callback
-                await interaction.response.send_modal(modal)
-        faq_dropdowns = [FaqDropdown(placeholder="Select a question", options=chunk) for chunk in faq_chunks]
+        faq_dropdowns = [FaqEditDropdown(self, placeholder="Select a question", options=chunk) for chunk in faq_chunks]
         view = ui.View()
         for dropdown in faq_dropdowns:
             view.add_item(dropdown)
         await interaction.response.send_message("Select a question", view=view, ephemeral=True)
 
     @ac.command(name="list", description="List all the FAQ questions")
-    @uses_db(CustomClient().sessionmaker)
+    @uses_db_readonly(_sm)
     async def list(self, interaction: Interaction, session: Session):
         """
         Lists all the FAQ questions
         """
-        faq_questions = session.query(Faq_model.question).all()
-        faq_questions_str = "\n".join([f"{index + 1}. {question[0]}" for index, question in enumerate(faq_questions)])
+        faq_questions_str = "\n".join(f"{index + 1}. {question}" for index, (_, question) in enumerate(self._get_faq(session)))
         await interaction.response.send_message(faq_questions_str, ephemeral=True)
 
 
@@ -63,10 +63,10 @@ class Unit(GroupCog):
                 unit = Unit_model(player_id=player.id, name=unit_name, unit_type=unit_type, active=False)
                 session.add(unit)
                 session.commit()
-                CustomClient().queue.put_nowait((1, unit))
                 logger.debug(f"Unit {unit.name} created for player {player.name}")
                 button.disabled = True
                 await interaction.response.send_message(f"Unit {unit.name} created", ephemeral=CustomClient().use_ephemeral)
+                await CustomClient().queue.put((1, unit)) # after responding, as the queue may make us wait for room
 
         view = CreateUnitView()
         await interaction.response.send_message("Please select the unit type and enter the unit name", view=view, ephemeral=CustomClient().use_ephemeral)
@@ -188,8 +188,8 @@ class Unit(GroupCog):
                 logger.debug(f"Removing unit {unit.name}")
                 session.delete(unit)
                 session.commit()
-                CustomClient().queue.put_nowait((1, player))
                 await interaction.response.send_message(f"Unit {unit.name} removed", ephemeral=CustomClient().use_ephemeral)
+                await CustomClient().queue.put((1, player)) # after responding, as the queue may make us wait for room
 
         view = View()
         try:
@@ -300,10 +300,10 @@ class Unit(GroupCog):
                         return
                     _unit.name = new_name
                     session.commit()
-                    CustomClient().queue.put_nowait((1, unit))
 
                     logger.info(f"Unit renamed to {new_name}")
                     await interaction.response.send_message(f"Unit renamed to {new_name}", ephemeral=CustomClient().use_ephemeral)
+                    await CustomClient().queue.put((1, unit)) # after responding, as the queue may make us wait for room
 
 
                 modal = ui.Modal(title="Rename Unit", custom_id="rename_unit")
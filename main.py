@@ -34,7 +34,7 @@ logging.basicConfig(level=logging.DEBUG,
                     ],
                     force=True) # needed to delete the default stderr handler
 # rest of the imports   
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from models import Base
 from customclient import CustomClient
@@ -53,27 +53,27 @@ engine = create_engine(
 
 logger.debug("Database engine created with URL: %s", os.getenv("DATABASE_URL"))
 
+@event.listens_for(engine, "connect")
+def _set_timeouts(dbapi_conn, conn_record):
+    # runs once per pooled connection instead of once per task
+    cursor = dbapi_conn.cursor()
+    cursor.execute("SET SESSION innodb_lock_wait_timeout = 10") # set the lock timeout to 10 seconds
+    cursor.close()
+
 # create the tables
 Base.metadata.create_all(bind=engine)
 logger.info("Database tables created successfully.")
 
-# create a session
+# create the sessionmaker, the bot makes a short lived session from it for each command and task
 Session = sessionmaker(bind=engine)
-session = Session()
-session.execute(text("SET SESSION innodb_lock_wait_timeout = 10")) # set the lock timeout to 10 seconds only for the global session
 
-logger.debug("Session created successfully.")
+logger.debug("Sessionmaker created successfully.")
 
 # create the bot
-bot = CustomClient(session, sessionmaker=Session)
+bot = CustomClient(sessionmaker=Session)
 logger.info("Bot created successfully.")
 
 # start the bot
 logger.info("starting bot")
 asyncio.run(bot.start())
-logger.info("Bot terminated")
-
-# close the session
-session.commit()
-session.close()
-logger.info("Session closed successfully.")
\ No newline at end of file
+logger.info("Bot terminated")
\ No newline at end of file
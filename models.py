@@ -28,20 +28,17 @@ class UnitStatus(PyEnum):
 def after_insert(mapper, connection, target):
     logger.debug(f"{target} was inserted into the database")
     from customclient import CustomClient
-    queue = CustomClient().queue
-    queue.put_nowait((0, target))
+    CustomClient().enqueue((0, target))
 
 def after_update(mapper, connection, target):
     logger.debug(f"{target} was updated in the database")
     from customclient import CustomClient
-    queue = CustomClient().queue
-    queue.put_nowait((1, target))
+    CustomClient().enqueue((1, target))
 
 def after_delete(mapper, connection, target):
     logger.debug(f"{target} was deleted from the database")
     from customclient import CustomClient
-    queue = CustomClient().queue
-    queue.put_nowait((2, target))
+    CustomClient().enqueue((2, target))
 
 
 class BaseModel(Base):
@@ -1,3 +1,7 @@
+from string import Formatter
+from typing import Callable
+import re
+
 Dossier = """{mention}
 # {player.name}
 
@@ -41,4 +45,43 @@ Info logs: today: {today_INFO} total: {total_INFO}
 Warning logs: today: {today_WARNING} total: {total_WARNING}
 Error logs: today: {today_ERROR} total: {total_ERROR}
 Critical logs: today: {today_CRITICAL} total: {total_CRITICAL}
-Total logs: today: {today_total} total: {total_total}"""
\ No newline at end of file
+Total logs: today: {today_total} total: {total_total}"""
+
+_FIELD = re.compile(r"[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*") # plain names and attribute access only
+
+def compile_template(template: str) -> Callable[..., str]:
+    """
+    Compiles a str.format template into an equivalent function built from an f-string,
+    so the template is parsed once at import rather than on every call.
+
+    Args:
+        template (str): The template to compile, its fields may only use names and attribute access.
+
+    Returns:
+        Callable[..., str]: A function taking the template's fields as keyword arguments.
+    """
+    parts = []
+    names = []
+    for literal, field, spec, conversion in Formatter().parse(template):
+        if literal:
+            parts.append(repr(literal))
+        if field is None:
+            continue
+        if not _FIELD.fullmatch(field):
+            raise ValueError(f"Unsupported field {field!r} in template")
+        name = field.split(".", 1)[0]
+        if name not in names:
+            names.append(name)
+        conversion = f"!{conversion}" if conversion else ""
+        spec = f":{spec}" if spec else ""
+        parts.append(f"f'{{{field}{conversion}{spec}}}'")
+    params = f"*, {', '.join(names)}" if names else ""
+    source = f"def _fmt({params}):\n    return ({' '.join(parts) or repr('')})\n"
+    namespace = {}
+    exec(source, namespace)
+    return namespace["_fmt"]
+
+# compiled forms of the templates rendered by the queue consumer
+Dossier_fmt = compile_template(Dossier)
+Statistics_Player_fmt = compile_template(Statistics_Player)
+Statistics_Unit_fmt = compile_template(Statistics_Unit)
@@ -5,7 +5,9 @@ from inspect import Signature
 from sqlalchemy.orm import scoped_session
 from logging import getLogger
 import asyncio
-from collections import deque
+import time
+from collections import deque, OrderedDict
+from typing import Hashable
 
 logger = getLogger(__name__)
 
@@ -50,37 +52,74 @@ def has_invalid_url(text: str) -> bool:
 class RollbackException(Exception):
     pass
 
-def uses_db(sessionmaker):
-    session_scope = scoped_session(sessionmaker)
+def _without_session_param(func) -> Signature:
+    """Returns the signature of func without its session parameter, as the decorators below supply it."""
+    original_signature = Signature.from_callable(func)
+    new_params = [param for name, param in original_signature.parameters.items() if name != "session"]
+    return original_signature.replace(parameters=new_params)
+
+def uses_db(sessionmaker, scopefunc=None):
+    # by default the session is shared per thread, a scopefunc such as asyncio.current_task gives each scope its own session
+    session_scope = scoped_session(sessionmaker, scopefunc=scopefunc)
     def decorator(func):
         logger.debug(f"decorating {func.__name__}")
-        original_signature = Signature.from_callable(func)
-        new_params = [param for name, param in original_signature.parameters.items() if name != "session"]
-        new_signature = original_signature.replace(parameters=new_params)
+        new_signature = _without_session_param(func)
         @wraps(func)
         async def wrapper(*args, **kwargs): 
-            with session_scope() as session: # we are not currently using async with, because the sessionmaker is not async yet
-                try:
-                    logger.debug(f"calling {func.__name__}")
-                    result = await func(*args, session=session, **kwargs)
-                    logger.debug(f"commiting session for {func.__name__}")
-                    session.commit()
-                    logger.debug(f"committed session for {func.__name__}")
-                    return result
-                except RollbackException:
-                    logger.debug(f"rolling back session for {func.__name__}")
-                    session.rollback()
-                    logger.debug(f"rolled back session for {func.__name__}")
-                    return None
-                except Exception as e:
-                    logger.debug(f"rolling back session for {func.__name__} due to unhandled exception")
-                    session.rollback()
-                    logger.debug(f"rolled back session for {func.__name__} due to unhandled exception")
-                    raise e
+            # with a custom scope, the outermost call removes the session so finished scopes don't stay in the registry
+            owns_scope = scopefunc is not None and not session_scope.registry.has()
+            try:
+                with session_scope() as session: # we are not currently using async with, because the sessionmaker is not async yet
+                    try:
+                        logger.debug(f"calling {func.__name__}")
+                        result = await func(*args, session=session, **kwargs)
+                        logger.debug(f"commiting session for {func.__name__}")
+                        session.commit()
+                        logger.debug(f"committed session for {func.__name__}")
+                        return result
+                    except RollbackException:
+                        logger.debug(f"rolling back session for {func.__name__}")
+                        session.rollback()
+                        logger.debug(f"rolled back session for {func.__name__}")
+                        return None
+                    except Exception as e:
+                        logger.debug(f"rolling back session for {func.__name__} due to unhandled exception")
+                        session.rollback()
+                        logger.debug(f"rolled back session for {func.__name__} due to unhandled exception")
+                        raise e
+            finally:
+                if owns_scope:
+                    session_scope.remove()
         wrapper.__signature__ = new_signature
         return wrapper
     return decorator
 
+def uses_db_readonly(sessionmaker):
+    # like uses_db, but for callbacks that only read, the session is closed instead of committed, so there's no COMMIT round trip
+    def decorator(func):
+        logger.debug(f"decorating {func.__name__} with a read only session")
+        new_signature = _without_session_param(func)
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with sessionmaker() as session: # closing rolls back the implicit transaction
+                logger.debug(f"calling {func.__name__}")
+                result = await func(*args, session=session, **kwargs)
+                if session.new or session.dirty or session.deleted:
+                    logger.warning(f"{func.__name__} changed objects in a read only session, the changes were discarded")
+                return result
+        wrapper.__signature__ = new_signature
+        return wrapper
+    return decorator
+
+async def gather_all(*aws):
+    """
+    Like asyncio.gather, but waits for every awaitable to finish before raising the first exception, so none are left running unobserved.
+    """
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
 
 def string_to_list(string: str) -> list[str]:
     if "\n" in string[:40]:
@@ -139,42 +178,58 @@ class RollingCounter:
     def __repr__(self):
         return f"RollingCounter(duration={self.duration}, counter={self.counter})"
 
-class RollingCounterDict:
-    def __init__(self, duration: int, loop=None):
+class SlidingWindowCounter:
+    def __init__(self, duration: int, max_keys: int = 10000):
         """
-        Initializes a RollingCounterDict with a specified duration for each counter.
+        Initializes a SlidingWindowCounter that approximates a rolling count per key using two fixed buckets.
 
-        :param duration: Duration in seconds for each RollingCounter. Must be > 0.
-        :param loop: Optional asyncio event loop to use. Defaults to asyncio.get_event_loop().
+        :param duration: Duration in seconds of the window. Must be > 0.
+        :param max_keys: Maximum number of keys to track, the least recently used keys are evicted first. Must be > 0.
         """
         if duration <= 0:
             raise ValueError("Duration must be greater than 0.")
+        if max_keys <= 0:
+            raise ValueError("Max keys must be greater than 0.")
         self.duration = duration
-        self.loop = loop or asyncio.get_event_loop()
-        self.counters = {}
-
-    def set(self, key: str):
+        self.max_keys = max_keys
+        self.counters: OrderedDict[Hashable, tuple[float, int, int]] = OrderedDict() # key -> (bucket_start, current, previous)
+
+    def _roll(self, key: Hashable, now: float) -> tuple[float, int, int]:
+        """Returns the buckets for the key, shifted so that the current bucket contains `now`."""
+        bucket_start, current, previous = self.counters.get(key, (now, 0, 0))
+        elapsed = now - bucket_start
+        if elapsed >= 2 * self.duration: # both buckets have expired
+            return now, 0, 0
+        if elapsed >= self.duration:
+            return bucket_start + self.duration, 0, current
+        return bucket_start, current, previous
+
+    def set(self, key: Hashable):
         """
         Increments the counter for the given key, initializing it if it doesn't exist.
 
         :param key: The key for the counter to increment.
         """
-        if key not in self.counters:
-            self.counters[key] = RollingCounter(self.duration, self.loop)
-        self.counters[key].set()
+        bucket_start, current, previous = self._roll(key, time.monotonic())
+        self.counters[key] = (bucket_start, current + 1, previous)
+        self.counters.move_to_end(key)
+        if len(self.counters) > self.max_keys:
+            self.counters.popitem(last=False)
 
-    def get(self, key: str) -> int:
+    def get(self, key: Hashable) -> float:
         """
-        Returns the current value of the counter for the given key, or 0.0 as a sentinel if the key doesn't exist.
+        Returns the weighted count for the given key over the last window, or 0.0 if the key doesn't exist.
 
         :param key: The key for the counter.
-        :return: The current value of the counter or 0.0.
+        :return: The previous bucket weighted by its overlap with the window, plus the current bucket.
         """
-        if key in self.counters:
-            return self.counters[key].get()
-        return float(0)
+        if key not in self.counters:
+            return float(0)
+        now = time.monotonic()
+        bucket_start, current, previous = self._roll(key, now)
+        return previous * ((self.duration - (now - bucket_start)) / self.duration) + current
 
-    def __setitem__(self, key: str, _: None):
+    def __setitem__(self, key: Hashable, _: None):
         """
         Increments the counter for the given key, initializing it if it doesn't exist.
 
@@ -182,28 +237,117 @@ class RollingCounterDict:
         """
         self.set(key)
 
-    def __getitem__(self, key: str) -> int:
+    def __getitem__(self, key: Hashable) -> float:
         """
-        Returns the current value of the counter for the given key, or 0.0 as a sentinel if the key doesn't exist.
+        Returns the weighted count for the given key over the last window, or 0.0 if the key doesn't exist.
 
         :param key: The key for the counter.
-        :return: The current value of the counter or 0.0.
         """
         return self.get(key)
-    
+
+class TokenBucket:
+    def __init__(self, capacity: int, refill_per_sec: float):
+        """
+        Initializes a TokenBucket that allows bursts of up to `capacity` operations, refilling at a fixed rate.
+
+        :param capacity: Maximum number of tokens the bucket can hold. Must be > 0.
+        :param refill_per_sec: Number of tokens added per second. Must be > 0.
+        """
+        if capacity <= 0:
+            raise ValueError("Capacity must be greater than 0.")
+        if refill_per_sec <= 0:
+            raise ValueError("Refill rate must be greater than 0.")
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.tokens: float = float(capacity)
+        self.last_refill: float = time.monotonic()
+
+    def _refill(self):
+        """Adds the tokens accumulated since the last refill, clamped to the capacity."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_per_sec)
+        self.last_refill = now
+
+    async def acquire(self):
+        """
+        Takes a token from the bucket, sleeping only as long as needed for one to become available.
+        """
+        self._refill()
+        while self.tokens < 1:
+            await asyncio.sleep((1 - self.tokens) / self.refill_per_sec)
+            self._refill()
+        self.tokens -= 1
+
+    def __repr__(self):
+        return f"TokenBucket(capacity={self.capacity}, refill_per_sec={self.refill_per_sec}, tokens={self.tokens:.2f})"
+
+class AdaptiveLimiter:
+    def __init__(self, initial: int, maximum: int, window: float = 60):
+        """
+        Initializes an AdaptiveLimiter, a concurrency limit that halves when throttled and grows by one after each clean window.
+
+        :param initial: Starting number of concurrent holders. Must be > 0.
+        :param maximum: Upper bound for the limit. Must be >= initial.
+        :param window: Seconds without being throttled before the limit grows by one. Must be > 0.
+        """
+        if initial <= 0:
+            raise ValueError("Initial limit must be greater than 0.")
+        if maximum < initial:
+            raise ValueError("Maximum limit must be at least the initial limit.")
+        if window <= 0:
+            raise ValueError("Window must be greater than 0.")
+        self.limit = initial
+        self.maximum = maximum
+        self.window = window
+        self.active = 0
+        self.last_change = time.monotonic()
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """
+        Waits until fewer than `limit` holders are active, then becomes one.
+        """
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self):
+        """
+        Releases a hold, growing the limit by one if it hasn't been throttled for a full window.
+        """
+        async with self._condition:
+            self.active -= 1
+            now = time.monotonic()
+            if self.limit < self.maximum and now - self.last_change >= self.window:
+                self.limit += 1
+                self.last_change = now
+                logger.debug(f"AdaptiveLimiter limit raised to {self.limit}")
+            self._condition.notify_all()
+
+    def throttle(self):
+        """
+        Halves the limit, down to a minimum of 1, and restarts the clean window.
+        """
+        self.limit = max(1, self.limit // 2)
+        self.last_change = time.monotonic()
+        logger.debug(f"AdaptiveLimiter limit lowered to {self.limit}")
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.release()
+
+    def __repr__(self):
+        return f"AdaptiveLimiter(limit={self.limit}, maximum={self.maximum}, active={self.active})"
+
 def chunk_list(lst: list, chunk_size: int) -> list[list]:
     """Splits a list into chunks of specified size."""
     if chunk_size <= 0:
         raise ValueError("Chunk size must be greater than 0")
-    
-    # Create chunks for all but the last chunk
-    chunks = [lst[i:i + chunk_size] for i in range(0, len(lst) - len(lst) % chunk_size, chunk_size)]
-    
-    # Handle the last chunk if there are remaining elements
-    if len(lst) % chunk_size != 0:
-        chunks.append(lst[-(len(lst) % chunk_size):])
-    
-    return chunks
+    # the last slice is simply shorter when the list doesn't divide evenly
+    return [lst[i:i + chunk_size] for i in range(0, len(lst), chunk_size)]
 
 class Paginator:
     # a bidirectional iterator over a list of items, with a constrained view size